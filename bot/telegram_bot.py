@@ -1,103 +1,197 @@
 import asyncio
+import io
 import logging
-import os
+import time
 from typing import Optional
 
+from cachetools import TTLCache
+
 from telegram import Update
+from telegram.error import TelegramError
 from telegram.ext import Application, MessageHandler, filters, ContextTypes, CommandHandler
+from telegram.request import HTTPXRequest
 
-from fastapi_app.services.employee import EmployeeService
+from fastapi_app.services.employee import EMAIL_RE, EmployeeService
 from fastapi_app.services.employee_cache_service import EmployeeCacheService
 from fastapi_app.services.timesheet_cache_service import TimesheetCacheService
-from processors.excel_generator import TimeSheetGenerator
+from processors.excel_generator import EMPLOYEE_NAME_PLACEHOLDER, TimeSheetGenerator
 
 logger = logging.getLogger(__name__)
 
 
-class TelegramBot:
+EXCEL_DOCUMENT_FILTER = filters.Document.FileExtension('xlsx') | filters.Document.FileExtension('xls')
+
+WELCOME_NEW_MESSAGE = (
+    'Welcome to Sheet Mate, {name}! 🎉\n\n'
+    'We need your email to complete your registration.\n'
+    'Please reply with your email address:'
+)
+WELCOME_BACK_MESSAGE = (
+    'Welcome back, {name}! 👋\n\n'
+    'Use /timesheet to get your timesheet template'
+)
+WELCOME_FALLBACK_MESSAGE = 'Welcome to Sheet Mate! Use /timesheet to get your timesheet template'
+TIMESHEET_CAPTION = '📊 Your timesheet template. Fill it and send it back!'
 
-    def __init__(self, token: str, webhook_url: str | None = None, redis_service=None):
+
+class TelegramBot:
+    EMAIL_STATE_TTL = 3600  # 1 hour to reply with an email after /start
+    MAX_EMAIL_ATTEMPTS = 3
+    EMPLOYEE_LOCAL_CACHE_TTL = 60  # 1 minute
+    EMPLOYEE_LOCAL_CACHE_SIZE = 10_000
+    TIMESHEET_BYTES_CACHE_TTL = 600  # 10 minutes
+    TIMESHEET_BYTES_CACHE_SIZE = 1000
+    HTTP_CONNECTION_POOL_SIZE = 256
+    MAX_CONCURRENT_UPDATES = 32
+
+    def __init__(
+            self,
+            token: str,
+            webhook_url: str | None = None,
+            redis_service=None,
+            employee_service: Optional[EmployeeService] = None
+    ):
         self.token = token
         self.webhook_url = webhook_url
-        self.application = Application.builder().token(token).build()
+        # One pooled HTTP/2 client multiplexes all replies over a few warm Bot API connections
+        request = HTTPXRequest(
+            connection_pool_size=self.HTTP_CONNECTION_POOL_SIZE,
+            http_version='2',
+            connect_timeout=5.0,
+            read_timeout=20.0,
+            pool_timeout=5.0,
+        )
+        self.application = (
+            Application.builder()
+            .token(token)
+            .request(request)
+            .concurrent_updates(self.MAX_CONCURRENT_UPDATES)
+            .build()
+        )
 
-        self.employee_service = EmployeeService()
+        self.employee_service = employee_service or EmployeeService()
         self.redis_service = redis_service
-        self.time_sheet_generator = TimeSheetGenerator()
 
-        self.set_up_handlers()
-        self._initialized = False  # Track initialization state
-
-    def _get_employee_cache_service(self) -> Optional[EmployeeCacheService]:
-        """Get employee cache service if Redis is available"""
-        if hasattr(self, '_employee_cache_service'):
-            return self._employee_cache_service
+        # Cache services are only available with Redis
+        self._employee_cache_service: Optional[EmployeeCacheService] = None
+        self._timesheet_cache_service: Optional[TimesheetCacheService] = None
 
         if self.redis_service:
             self._employee_cache_service = EmployeeCacheService(
                 redis_service=self.redis_service,
                 employee_service=self.employee_service
             )
-            return self._employee_cache_service
-        return None
+            self._timesheet_cache_service = TimesheetCacheService(redis_service=self.redis_service)
+
+        # Shared timesheet template per (month, year), only the employee name differs between users
+        self._timesheet_templates: dict[tuple[int, int], bytes] = {}
+
+        # Employees per telegram id, so hot users skip the Redis/DB round-trip
+        self._employee_local_cache = TTLCache(
+            maxsize=self.EMPLOYEE_LOCAL_CACHE_SIZE, ttl=self.EMPLOYEE_LOCAL_CACHE_TTL
+        )
+        # Generated timesheet bytes per (employee name, month, year), so repeat requests skip generation
+        self._timesheet_bytes_cache = TTLCache(
+            maxsize=self.TIMESHEET_BYTES_CACHE_SIZE, ttl=self.TIMESHEET_BYTES_CACHE_TTL
+        )
+
+        self.set_up_handlers()
+        self._initialized = False  # Track initialization state
 
     async def _get_employee_data(self, telegram_id: str, name: str):
         """Get employee data using cache if available"""
-        cache_service = self._get_employee_cache_service()
-
-        if cache_service:
-            return await cache_service.get_or_create_employee(telegram_id=telegram_id, name=name)
+        if self._employee_cache_service is not None:
+            return await self._employee_cache_service.get_or_create_employee(telegram_id=telegram_id, name=name)
         return await self.employee_service.get_or_create_employee(telegram_id=telegram_id, name=name)
 
     async def _get_employee_by_telegram_id(self, telegram_id: str):
-        """Get employee by telegram id using cache if available"""
-        cache_service = self._get_employee_cache_service()
+        """Get employee by telegram id using local and shared cache if available"""
+        if (employee := self._employee_local_cache.get(telegram_id)) is not None:
+            return employee
+
+        if self._employee_cache_service is not None:
+            employee = await self._employee_cache_service.get_employee_by_telegram_id(telegram_id=telegram_id)
+        else:
+            employee = await self.employee_service.get_employee_by_telegram_id(telegram_id=telegram_id)
 
-        if cache_service:
-            return await cache_service.get_employee_by_telegram_id(telegram_id=telegram_id)
-        return await self.employee_service.get_employee_by_telegram_id(telegram_id=telegram_id)
+        if employee:
+            self._employee_local_cache[telegram_id] = employee
+        return employee
 
     async def _update_employee_email(self, telegram_id: str, email: str):
         """Update employee email using cache if available"""
-        cache_service = self._get_employee_cache_service()
-
-        if cache_service:
-            return await cache_service.update_employee_email(telegram_id=telegram_id, email=email)
+        self._employee_local_cache.pop(telegram_id, None)
+        if self._employee_cache_service is not None:
+            return await self._employee_cache_service.update_employee_email(telegram_id=telegram_id, email=email)
         return await self.employee_service.update_employee_email(telegram_id=telegram_id, email=email)
 
-    def _get_timesheet_cache_service(self):
-        """Get timesheet cache service if Redis is available"""
-        if hasattr(self, '_timesheet_cache_service'):
-            return self._timesheet_cache_service
+    @staticmethod
+    def _get_employee_field(employee, field: str):
+        """Read a field from an employee Row or its cached dict form"""
+        if isinstance(employee, dict):
+            return employee.get(field)
+        return getattr(employee, field)
 
-        if self.redis_service:
-            self._timesheet_cache_service = TimesheetCacheService(
-                redis_service=self.redis_service,
-                timesheet_generator=self.time_sheet_generator
-            )
-            return self._timesheet_cache_service
-        return None
+    async def _get_timesheet_bytes(self, *, employee_name: str, timesheet_generator: TimeSheetGenerator) -> bytes:
+        """Get timesheet file content from the in-memory cache or generate it"""
+        cache_key = (employee_name, timesheet_generator.month, timesheet_generator.year)
+        if (timesheet_bytes := self._timesheet_bytes_cache.get(cache_key)) is not None:
+            return timesheet_bytes
 
-    async def _generate_timesheet(self, employee_name: str):
-        """Generate timesheet using cache if available"""
-        cache_service = self._get_timesheet_cache_service()
+        template = await self._get_timesheet_template(timesheet_generator)
+        try:
+            # Patch employee's name into the template without parsing the workbook, off the event loop
+            timesheet_bytes = await asyncio.to_thread(TimeSheetGenerator.fill_employee_name, template, employee_name)
+        except Exception as e:
+            logger.error(f'❌ Error generating from template for {employee_name}: {str(e)}')
+            timesheet_bytes = await timesheet_generator.generate_timesheet_bytes(employee_name=employee_name)
 
-        if cache_service:
-            return await cache_service.generate_timesheet(employee_name=employee_name)
-        return await self.time_sheet_generator.generate_timesheet(employee_name=employee_name)
+        self._timesheet_bytes_cache[cache_key] = timesheet_bytes
+        return timesheet_bytes
+
+    async def _get_timesheet_template(self, timesheet_generator: TimeSheetGenerator) -> bytes:
+        """Get the shared timesheet template of the generator's month, generating it on first use"""
+        period = (timesheet_generator.month, timesheet_generator.year)
+
+        if (template := self._timesheet_templates.get(period)) is None:
+            if self._timesheet_cache_service is not None:
+                # Shared with other workers through Redis
+                template = await self._timesheet_cache_service.get_template(timesheet_generator)
+            else:
+                template = await timesheet_generator.generate_timesheet_bytes(employee_name=EMPLOYEE_NAME_PLACEHOLDER)
+            # Only the current month is requested, drop templates of past months
+            self._timesheet_templates = {period: template}
+        return template
+
+    async def invalidate_timesheets(self) -> None:
+        """Drop all cached timesheets, in this process and in Redis"""
+        self._timesheet_templates = {}
+        self._timesheet_bytes_cache.clear()
+        if self._timesheet_cache_service is not None:
+            await self._timesheet_cache_service.invalidate_all_timesheets()
+
+    @staticmethod
+    def _get_timesheet_filename(employee_name: str, timesheet_generator: TimeSheetGenerator) -> str:
+        """Build the file name shown to the user for their timesheet"""
+        month, year = timesheet_generator.month, timesheet_generator.year
+        return f"Timesheet_{employee_name.replace(' ', '_')}_{month:02}_{year}.xlsx"
 
     def set_up_handlers(self):
         """Set up Telegram bot command handlers"""
         self.application.add_handler(CommandHandler('start', self.start_command))
         self.application.add_handler(CommandHandler('timesheet', self.timesheet_command))
-        self.application.add_handler(MessageHandler(filters.Document.ALL, self.handle_document))
+        self.application.add_handler(MessageHandler(EXCEL_DOCUMENT_FILTER, self.handle_document))
+        self.application.add_handler(MessageHandler(filters.Document.ALL & ~EXCEL_DOCUMENT_FILTER, self.reject_document))
         self.application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_message))
 
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /start command"""
         user = update.effective_user
         telegram_id = str(user.id)
-        name = f'{user.first_name} {user.last_name or ""}'.strip()
+        name = f'{user.first_name} {user.last_name}' if user.last_name else user.first_name
+
+        # Drop any state left over from a previous /start
+        self._clear_email_state(context)
 
         try:
             employee = await self._get_employee_data(
@@ -106,28 +200,19 @@ class TelegramBot:
             )
 
             # Check if employee has email
-            if employee and employee.email is None:
-                welcome_message = (
-                    f'Welcome to Sheet Mate, {user.first_name}! 🎉\n\n'
-                    f'We need your email to complete your registration.\n'
-                    f'Please reply with your email address:'
-                )
-                # Store state to expect email next
-                context.user_data['awaiting_email'] = True
+            if employee and self._get_employee_field(employee, 'email') is None:
+                welcome_message = WELCOME_NEW_MESSAGE.format(name=user.first_name)
+                # Store state to expect email next, until it expires
+                context.user_data['awaiting_email'] = time.time() + self.EMAIL_STATE_TTL
                 context.user_data['telegram_id'] = telegram_id
             else:
-                welcome_message = (
-                    f'Welcome back, {user.first_name}! 👋\n\n'
-                    f'Use /timesheet to get your timesheet template'
-                )
+                welcome_message = WELCOME_BACK_MESSAGE.format(name=user.first_name)
 
             await update.message.reply_text(welcome_message)
 
         except Exception as e:
             logger.error(f'Error in start command: {e}')
-            await update.message.reply_text(
-                'Welcome to Sheet Mate! Use /timesheet to get your timesheet template'
-            )
+            await update.message.reply_text(WELCOME_FALLBACK_MESSAGE)
 
     async def timesheet_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /timesheet command - generate and send Excel file"""
@@ -140,51 +225,84 @@ class TelegramBot:
                 await update.message.reply_text('❌ Employee not found. Please use /start first.')
                 return
 
-            if isinstance(employee, dict):
-                employee_name = employee.get('name')
-            else:
-                employee_name = employee.name
-            file_path = await self._generate_timesheet(employee_name=employee_name)
-
-            # Send file via telegram
-            with open(file_path, 'rb') as f:
-                await update.message.reply_document(
-                    document=f,
-                    filename=os.path.basename(file_path),
-                    caption='📊 Your timesheet template. Fill it and send it back!',
-                )
-
-            # Cleanup
-            os.unlink(file_path)
+            employee_name = self._get_employee_field(employee, 'name')
+            await self._send_timesheet(update=update, employee_name=employee_name)
 
         except Exception as e:
             logger.error(f'Error generating timesheet: {str(e)}')
             await update.message.reply_text('❌ Error generating timesheet. Please try again.')
 
+    async def _send_timesheet(self, *, update: Update, employee_name: str):
+        """Send timesheet, reusing the file already uploaded to Telegram if possible"""
+        cache_service = self._timesheet_cache_service
+        # Per request, so the timesheet is always for the current month
+        timesheet_generator = TimeSheetGenerator()
+        month, year = timesheet_generator.month, timesheet_generator.year
+
+        if cache_service is not None and (
+                file_id := await cache_service.get_file_id(employee_name=employee_name, month=month, year=year)
+        ):
+            try:
+                await update.message.reply_document(document=file_id, caption=TIMESHEET_CAPTION)
+                return
+            except TelegramError as e:
+                logger.warning(f'Cached timesheet file id rejected for {employee_name}: {e}')
+
+        timesheet_bytes = await self._get_timesheet_bytes(
+            employee_name=employee_name,
+            timesheet_generator=timesheet_generator
+        )
+
+        # Send file via telegram straight from memory
+        message = await update.message.reply_document(
+            document=io.BytesIO(timesheet_bytes),
+            filename=self._get_timesheet_filename(employee_name, timesheet_generator),
+            caption=TIMESHEET_CAPTION,
+        )
+
+        if cache_service is not None:
+            await cache_service.set_file_id(
+                employee_name=employee_name,
+                month=month,
+                year=year,
+                file_id=message.document.file_id
+            )
+
     async def handle_document(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle when user sends filled Excel file"""
         # TODO: Implement document processing
-        document = update.message.document
-        file_name = document.file_name
+        file_name = update.message.document.file_name
 
-        if file_name and file_name.endswith(('.xlsx', '.xls')):
-            await update.message.reply_text(
-                f'📄 Received your timesheet: {file_name}\n\n'
-                f'Processing your timesheet...'
-            )
-            # TODO: Add timesheet processing logic
-        else:
-            await update.message.reply_text(
-                '❌ Please send an Excel file (.xlsx or .xls)'
-            )
+        await update.message.reply_text(
+            f'📄 Received your timesheet: {file_name}\n\n'
+            f'Processing your timesheet...'
+        )
+        # TODO: Add timesheet processing logic
+
+    async def reject_document(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle when user sends a document that is not an Excel file"""
+        await update.message.reply_text(
+            '❌ Please send an Excel file (.xlsx or .xls)'
+        )
 
     async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle regular messages including email collection"""
-        if context.user_data.get('awaiting_email'):
+        awaiting_email_until = context.user_data.get('awaiting_email')
+
+        if awaiting_email_until and awaiting_email_until < time.time():
+            # Email prompt expired, the user has to /start again
+            self._clear_email_state(context)
+            awaiting_email_until = None
+
+        if awaiting_email_until:
             email_text = update.message.text.strip()
             telegram_id = context.user_data.get('telegram_id')
 
             try:
+                # Reject malformed emails before any Redis/DB round-trip
+                if not EMAIL_RE.match(email_text):
+                    raise ValueError('Invalid email format')
+
                 await self._update_employee_email(telegram_id, email_text)
 
                 await update.message.reply_text(
@@ -194,17 +312,24 @@ class TelegramBot:
                 )
 
                 # Clear the state
-                context.user_data['awaiting_email'] = False
-
-                if 'telegram_id' in context.user_data:
-                    del context.user_data['telegram_id']
+                self._clear_email_state(context)
 
             except ValueError as e:
-                await update.message.reply_text(
-                    f'❌ {str(e)}\n\nPlease provide a valid email address:'
-                )
+                email_attempts = context.user_data.get('email_attempts', 0) + 1
+
+                if email_attempts >= self.MAX_EMAIL_ATTEMPTS:
+                    self._clear_email_state(context)
+                    await update.message.reply_text(
+                        f'❌ {str(e)}\n\nToo many attempts. Please try /start again.'
+                    )
+                else:
+                    context.user_data['email_attempts'] = email_attempts
+                    await update.message.reply_text(
+                        f'❌ {str(e)}\n\nPlease provide a valid email address:'
+                    )
             except Exception as e:
                 logger.error(f'Error saving email: {e}')
+                self._clear_email_state(context)
                 await update.message.reply_text(
                     'Sorry, there was an error saving your email. Please try /start again.'
                 )
@@ -214,6 +339,12 @@ class TelegramBot:
                 'I didn\'t understand that. Use /start to begin or /timesheet for your timesheet.'
             )
 
+    @staticmethod
+    def _clear_email_state(context: ContextTypes.DEFAULT_TYPE):
+        """Remove email collection state from user data"""
+        for key in ('awaiting_email', 'telegram_id', 'email_attempts'):
+            context.user_data.pop(key, None)
+
     async def setup_webhook(self):
         """Setup webhook with Telegram"""
         if not self.webhook_url:
@@ -224,11 +355,20 @@ class TelegramBot:
         await self.application.start()
         self._initialized = True
 
-        # Remove any existing webhook first to avoid conflicts
-        await self.application.bot.delete_webhook()
-        await asyncio.sleep(1)  # Brief pause
+        # Load the current month's template into memory before the first request.
+        # Only a warm-up, a failure must not keep the webhook from being registered
+        try:
+            await self._get_timesheet_template(TimeSheetGenerator())
+        except Exception as e:
+            logger.error(f'Failed to warm up timesheet template: {e}')
+
+        # Another worker or a previous run may have registered it already
+        webhook_info = await self.application.bot.get_webhook_info()
+        if webhook_info.url == self.webhook_url:
+            logger.info(f'Webhook URL already set to {self.webhook_url}')
+            return
 
-        # Set new webhook
+        # Set new webhook, it replaces any existing one
         await self.application.bot.set_webhook(
             url=self.webhook_url,
             drop_pending_updates=True  # Clear any pending updates
@@ -240,7 +380,7 @@ class TelegramBot:
         await self.application.bot.delete_webhook()
         logger.info('Webhook removed')
 
-        # Shutdown the application
+        # Shutdown the application, stop() handles updates still in the queue
         if self._initialized:
             await self.application.stop()
             await self.application.shutdown()
@@ -253,4 +393,7 @@ class TelegramBot:
             return
 
         update = Update.de_json(update_data, self.application.bot)
-        await self.application.process_update(update)
+
+        # Queue the update so the webhook can be acknowledged right away, the
+        # application processes queued updates with bounded concurrency
+        await self.application.update_queue.put(update)
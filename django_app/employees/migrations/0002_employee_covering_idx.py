@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-15 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employees', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='employee',
+            index=models.Index(fields=['telegram_id'], include=('id', 'name', 'email', 'is_active', 'created_at'), name='employee_tg_id_covering_idx'),
+        ),
+    ]
@@ -8,6 +8,16 @@ class Employee(models.Model):
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Lets lookups by telegram_id (bot hot path) be served by an index-only scan
+            models.Index(
+                fields=["telegram_id"],
+                include=["id", "name", "email", "is_active", "created_at"],
+                name="employee_tg_id_covering_idx",
+            )
+        ]
+
     def __str__(self):
         return self.name
 
@@ -1,26 +1,33 @@
 import os
 from typing import AsyncGenerator
 
-from sqlalchemy import QueuePool
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 ASYNC_DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://")
 
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 20))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 30))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))  # seconds
+
 engine = create_async_engine(
     ASYNC_DATABASE_URL,
     pool_pre_ping=True,
-    pool_size=10,
-    poolclass=QueuePool,
-    max_overflow=20,
+    pool_size=DB_POOL_SIZE,
+    poolclass=AsyncAdaptedQueuePool,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_recycle=DB_POOL_RECYCLE,
+    # Detect dead idle connections (e.g. dropped by NAT) early
+    connect_args={"server_settings": {"tcp_keepalives_idle": "30"}},
 )
 AsyncSessionLocal = async_sessionmaker(bind=engine, expire_on_commit=False, class_=AsyncSession)
 
 
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
     """Dependency that provides async database session"""
-    with AsyncSessionLocal() as session:
+    async with AsyncSessionLocal() as session:
         try:
             yield session
         finally:
-            session.close()
+            await session.close()
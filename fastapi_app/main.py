@@ -2,8 +2,10 @@ import logging
 import os
 from contextlib import asynccontextmanager
 
+import orjson
 from fastapi import Depends, FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 
 from bot.telegram_bot import TelegramBot
 from fastapi_app.services.redis import RedisService
@@ -14,7 +16,9 @@ logger = logging.getLogger(__name__)
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 API_BASE_URL = os.getenv('API_BASE_URL', None)
 REDIS_URL = os.getenv('REDIS_URL', None)
+ALLOWED_ORIGINS = [origin for origin in os.getenv('ALLOWED_ORIGINS', '').split(',') if origin]
 WEBHOOK_PATH = '/webhook/telegram'
+WEBHOOK_URL = f'{API_BASE_URL}{WEBHOOK_PATH}' if API_BASE_URL else None
 
 bot = None
 redis_service = RedisService(redis_url=REDIS_URL)
@@ -34,9 +38,7 @@ async def lifespan(app: FastAPI):
 
     # Initialize Telegram bot
     global bot
-    bot = TelegramBot(
-        token=TELEGRAM_BOT_TOKEN, webhook_url=f'{API_BASE_URL}{WEBHOOK_PATH}', redis_service=redis_service
-    )
+    bot = TelegramBot(token=TELEGRAM_BOT_TOKEN, webhook_url=WEBHOOK_URL, redis_service=redis_service)
 
     try:
         await bot.setup_webhook()
@@ -49,30 +51,37 @@ async def lifespan(app: FastAPI):
     # Shutdown
     logger.info('Shutting down Sheet Mate API')
 
+    # Stop the bot first, it finishes queued updates which may still need Redis
+    if bot:
+        try:
+            await bot.remove_webhook()
+            logger.info('Bot webhook removed successfully')
+        except Exception as e:
+            logger.error(f'Error removing webhook: {e}')
+
     try:
         await redis_service.disconnect()
         logger.info('Redis disconnected successfully')
     except Exception as e:
         logger.error(f'Error disconnecting Redis: {e}')
 
-    if bot:
-        await bot.remove_webhook()
-        logger.info('Bot webhook removed successfully')
-
 app = FastAPI(
     title='Sheet Mate API',
     description='Excel timesheet processing and Telegram bot',
     version='1.0',
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=['*'],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# The Telegram webhook is server-to-server, CORS is only needed for configured browser origins
+if ALLOWED_ORIGINS:
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=ALLOWED_ORIGINS,
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
 
 # Dependency for Redis service
 def get_redis_service():
@@ -90,7 +99,7 @@ async def telegram_webhook(request: Request):
         raise HTTPException(status_code=503, detail='Bot not initialized')
 
     try:
-        update_data = await request.json()
+        update_data = orjson.loads(await request.body())
         await bot.process_update(update_data)
         return {'status': 'ok'}
     except Exception as e:
@@ -117,5 +126,5 @@ async def health_check(redis_service: RedisService = Depends(get_redis_service))
         'status': 'healthy',
         'bot': bot_status,
         'redis': redis_status,
-        'webhook_url': f'{API_BASE_URL}{WEBHOOK_PATH}' if API_BASE_URL else 'not set'
+        'webhook_url': WEBHOOK_URL or 'not set'
     }
@@ -1,15 +1,20 @@
 import logging
 import re
 from datetime import datetime
+from typing import Optional
 
 from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from fastapi_app.database import AsyncSessionLocal
 from fastapi_app.tables import employees as employees_table
 
 logger = logging.getLogger(__name__)
 
+EMAIL_RE = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}\Z')
+
 
 class EmployeeService:
 
@@ -18,23 +23,31 @@ class EmployeeService:
 
         async with AsyncSessionLocal() as db:
             try:
-                employee = await self.get_employee_by_telegram_id(telegram_id=telegram_id)
+                employee = await self.get_employee_by_telegram_id(telegram_id=telegram_id, db=db)
 
                 if employee:
                     return employee
 
-                # Create new employee
-                insert_stmt = employees_table.insert().values(
-                    name=name,
-                    telegram_id=telegram_id,
-                    email=None,
-                    is_active=True,
-                    created_at=datetime.now(),
+                # Create new employee, a concurrent /start may have created it meanwhile
+                insert_stmt = (
+                    pg_insert(employees_table)
+                    .values(
+                        name=name,
+                        telegram_id=telegram_id,
+                        email=None,
+                        is_active=True,
+                        created_at=datetime.now(),
+                    )
+                    .on_conflict_do_nothing(index_elements=[employees_table.c.telegram_id])
+                    .returning(employees_table)  # returns the inserted row, None on conflict
                 )
-                await db.execute(insert_stmt)
+                result = await db.execute(insert_stmt)
+                new_employee = result.fetchone()
                 await db.commit()
 
-                new_employee = await self.get_employee_by_telegram_id(telegram_id=telegram_id)
+                if new_employee is None:
+                    # Lost the race, the other request's row is committed
+                    new_employee = await self.get_employee_by_telegram_id(telegram_id=telegram_id, db=db)
                 return new_employee
 
             except Exception as e:
@@ -44,17 +57,17 @@ class EmployeeService:
 
     async def update_employee_email(self, telegram_id: str, email: str):
         """Update employee email with validation"""
+        # Validate email format before touching the DB
+        if not self._is_valid_email(email):
+            raise ValueError('Invalid email format')
+
         async with AsyncSessionLocal() as db:
             try:
-                # Validate email format
-                if not self._is_valid_email(email):
-                    raise ValueError('Invalid email format')
-
                 update_stmt = (
                     employees_table.update()
                     .where(employees_table.c.telegram_id == telegram_id)
                     .values(email=email)
-                    .returning(employees_table) # returns the updated row
+                    .returning(employees_table)  # returns the updated row
                 )
                 result = await db.execute(update_stmt)
                 updated_employee = result.fetchone()
@@ -76,16 +89,20 @@ class EmployeeService:
 
     def _is_valid_email(self, email: str) -> bool:
         """Basic email validation"""
-        pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        return re.match(pattern, email) is not None
-
-    async def get_employee_by_telegram_id(self, telegram_id: str):
-        '''Get employee by telegram ID'''
-        async with AsyncSessionLocal() as db:
-            try:
-                stmt = select(employees_table).where(employees_table.c.telegram_id == telegram_id)
-                result = await db.execute(stmt)
-                return result.fetchone()
-            except Exception as e:
-                logger.error(f'Error in get_employee_by_telegram_id: {e}')
-                raise
+        return EMAIL_RE.match(email) is not None
+
+    async def get_employee_by_telegram_id(self, telegram_id: str, db: Optional[AsyncSession] = None):
+        '''Get employee by telegram ID, reusing the caller's session if given'''
+        if db is None:
+            async with AsyncSessionLocal() as db:
+                return await self._select_employee_by_telegram_id(db=db, telegram_id=telegram_id)
+        return await self._select_employee_by_telegram_id(db=db, telegram_id=telegram_id)
+
+    async def _select_employee_by_telegram_id(self, *, db: AsyncSession, telegram_id: str):
+        try:
+            stmt = select(employees_table).where(employees_table.c.telegram_id == telegram_id)
+            result = await db.execute(stmt)
+            return result.fetchone()
+        except Exception as e:
+            logger.error(f'Error in get_employee_by_telegram_id: {e}')
+            raise
@@ -1,14 +1,22 @@
+import asyncio
 import logging
 from typing import Optional, Any
 
 from fastapi_app.services.employee import EmployeeService
 from fastapi_app.services.redis import RedisService
+from fastapi_app.tables import employees as employees_table
 
 logger = logging.getLogger(__name__)
 
+# Employee rows are always full selects of the table, in column order.
+# Plain str, column keys are SQLAlchemy quoted_name objects
+EMPLOYEE_COLUMNS = tuple(str(key) for key in employees_table.c.keys())
+
 
 class EmployeeCacheService:
     EMPLOYEE_CACHE_TTL = 3600  # 1 hour
+    EMPLOYEE_NOT_FOUND_CACHE_TTL = 60  # 1 minute
+    EMPLOYEE_NOT_FOUND = '__not_found__'  # cached in place of employees missing from the DB
 
     def __init__(self, redis_service: RedisService, employee_service: EmployeeService):
         self.redis_service = redis_service
@@ -22,20 +30,41 @@ class EmployeeCacheService:
             self,
             telegram_id: str,
             fetch_func: callable,
+            cache_not_found: bool = False,
+            speculative_lookup_func: Optional[callable] = None,
             **fetch_kwargs
     ) -> Optional[Any]:
         cache_key = self._get_employee_cache_key(telegram_id)
 
+        # For mostly-missing lookups start a read-only lookup right away instead of after the cache read,
+        # it is cancelled on a cache hit. Writes never run speculatively
+        lookup_task = None
+        if speculative_lookup_func:
+            lookup_task = asyncio.create_task(speculative_lookup_func(telegram_id=telegram_id))
+            # Retrieve the outcome, so a lookup failing before it is cancelled is not reported as unhandled
+            lookup_task.add_done_callback(lambda task: task.cancelled() or task.exception())
+
         # Try cache first
         cached_data = await self.redis_service.get(cache_key)
 
-        if cached_data:
+        if cached_data == self.EMPLOYEE_NOT_FOUND:
+            # Lookups trust the marker, get-or-create has to reach the DB to create the employee
+            if cache_not_found:
+                logger.info(f'Cache hit for missing employee {telegram_id}')
+                if lookup_task:
+                    lookup_task.cancel()
+                return None
+        elif cached_data:
             logger.info(f'Cache hit for employee {telegram_id}')
+            if lookup_task:
+                lookup_task.cancel()
             return cached_data
 
-        # Cache miss - get from service
+        # Cache miss - get from service, the speculative lookup first if there is one
         logger.info(f'Cache miss for employee {telegram_id}')
-        employee = await fetch_func(telegram_id=telegram_id, **fetch_kwargs)
+        employee = await lookup_task if lookup_task else None
+        if not employee:
+            employee = await fetch_func(telegram_id=telegram_id, **fetch_kwargs)
 
         # Cache the result
         if employee:
@@ -47,23 +76,19 @@ class EmployeeCacheService:
                 expire_seconds=self.EMPLOYEE_CACHE_TTL
             )
             logger.info(f'Cached employee {telegram_id}')
+        elif cache_not_found:
+            # Short-lived, so the employee is picked up soon after /start creates it elsewhere
+            await self.redis_service.set(
+                key=cache_key,
+                value=self.EMPLOYEE_NOT_FOUND,
+                expire_seconds=self.EMPLOYEE_NOT_FOUND_CACHE_TTL
+            )
 
         return employee  # Return original Row object, not the dict
 
-    def _row_to_dict(self, row):
-        """Convert SQLAlchemy Row object to dictionary"""
-        if hasattr(row, '_asdict'):
-            # Row object with _asdict method
-            return row._asdict()
-        elif hasattr(row, '_fields'):
-            # Namedtuple-like object
-            return {field: getattr(row, field) for field in row._fields}
-        elif isinstance(row, (tuple, list)):
-            # It's a plain tuple - convert to dict with column names
-            columns = ['id', 'name', 'email', 'telegram_id', 'is_active', 'created_at']
-            return dict(zip(columns, row))
-        else:
-            return row
+    def _row_to_dict(self, row) -> dict:
+        """Convert employees Row object to dictionary"""
+        return dict(zip(EMPLOYEE_COLUMNS, row))
 
     async def get_or_create_employee(
             self,
@@ -74,6 +99,8 @@ class EmployeeCacheService:
         return await self._get_with_caching(
             telegram_id=telegram_id,
             fetch_func=self.employee_service.get_or_create_employee,
+            # /start is mostly sent by new or long-inactive users, only the SELECT is overlapped with Redis
+            speculative_lookup_func=self.employee_service.get_employee_by_telegram_id,
             name=name
         )
 
@@ -85,6 +112,7 @@ class EmployeeCacheService:
         return await self._get_with_caching(
             telegram_id=telegram_id,
             fetch_func=self.employee_service.get_employee_by_telegram_id,
+            cache_not_found=True,
         )
 
     async def update_employee_email(
@@ -104,7 +132,7 @@ class EmployeeCacheService:
             cache_key = self._get_employee_cache_key(telegram_id)
             await self.redis_service.set(
                 key=cache_key,
-                value=updated_employee,
+                value=self._row_to_dict(updated_employee),  # Store as dict instead of Row
                 expire_seconds=self.EMPLOYEE_CACHE_TTL
             )
             logger.info(f'Refreshed cache for updated employee {telegram_id}')
@@ -1,20 +1,39 @@
-import json
 import logging
+import os
+
+import orjson
 import redis.asyncio as redis
 from typing import Optional, Any
 
 logger = logging.getLogger(__name__)
 
+REDIS_MAX_CONNECTIONS = int(os.getenv('REDIS_MAX_CONNECTIONS', 32))
+REDIS_POOL_TIMEOUT = int(os.getenv('REDIS_POOL_TIMEOUT', 5))  # seconds to wait for a free connection
+
 
 class RedisService:
+    SCAN_COUNT = 1000  # keys examined per SCAN round-trip
+    UNLINK_BATCH_SIZE = 500
+
     def __init__(self, redis_url: str) -> None:
         self.redis_url = redis_url
+        self.pool: Optional[redis.BlockingConnectionPool] = None
         self.client: Optional[redis.Redis] = None
 
+        if self.redis_url:
+            # Connections are opened lazily on first use, no await needed here.
+            # Responses stay bytes, orjson parses them without a separate decode pass.
+            # When all connections are busy callers wait for one instead of failing
+            self.pool = redis.BlockingConnectionPool.from_url(
+                url=self.redis_url,
+                max_connections=REDIS_MAX_CONNECTIONS,
+                timeout=REDIS_POOL_TIMEOUT
+            )
+            self.client = redis.Redis(connection_pool=self.pool)
+
     async def connect(self) -> None:
-        """Initialize Redis connection"""
+        """Check Redis connection"""
         try:
-            self.client = redis.from_url(url=self.redis_url, decode_responses=True)
             await self.client.ping()
             logger.info("Redis connected successfully")
         except Exception as e:
@@ -24,27 +43,33 @@ class RedisService:
     async def disconnect(self) -> None:
         """Close Redis connection"""
         if self.client:
-            await self.client.close()
+            await self.client.aclose()
+        if self.pool:
+            await self.pool.disconnect()
 
     async def get(self, key: str) -> Optional[Any]:
         """Get value from cache"""
         try:
-            if not self.client:
-                await self.connect()
             if value := await self.client.get(key):
-                return json.loads(value)
+                return orjson.loads(value)
             return None
 
         except Exception as e:
             logger.error(f'Redis get error for key: {key}: {e}')
             return None
 
+    async def get_raw(self, key: str) -> Optional[bytes]:
+        """Get value stored without JSON encoding from cache"""
+        try:
+            return await self.client.get(key)
+
+        except Exception as e:
+            logger.error(f'Redis get error for key: {key}: {e}')
+            return None
+
     async def delete(self, key: str) -> bool:
         """Delete key from cache"""
         try:
-            if not self.client:
-                await self.connect()
-
             await self.client.delete(key)
             return True
 
@@ -55,11 +80,17 @@ class RedisService:
     async def delete_pattern(self, pattern: str) -> bool:
         """Delete keys matching from cache"""
         try:
-            if not self.client:
-                await self.connect()
-
-            if keys := await self.client.keys(pattern):
-                await self.client.delete(*keys)
+            # SCAN walks the keyspace in steps instead of blocking Redis like KEYS,
+            # UNLINK frees memory in the background
+            batch = []
+            async for key in self.client.scan_iter(match=pattern, count=self.SCAN_COUNT):
+                batch.append(key)
+                if len(batch) >= self.UNLINK_BATCH_SIZE:
+                    await self.client.unlink(*batch)
+                    batch = []
+
+            if batch:
+                await self.client.unlink(*batch)
             return True
 
         except Exception as e:
@@ -69,16 +100,24 @@ class RedisService:
     async def set(self, *, key: str, value: Any, expire_seconds: int = 3600) -> bool:
         """Set value in cache with expiration"""
         try:
-            if not self.client:
-                await self.connect()
-
             await self.client.setex(
                 key,
                 expire_seconds,
-                json.dumps(value, default=str)
+                # Non-str keys covers str subclasses too, e.g. SQLAlchemy column names
+                orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS)
             )
             return True
 
         except Exception as e:
             logger.error(f'Redis set error for key: {key}: {e}')
             return False
+
+    async def set_raw(self, *, key: str, value: str | bytes, expire_seconds: int = 3600) -> bool:
+        """Set value in cache as is, without JSON encoding, with expiration"""
+        try:
+            await self.client.setex(key, expire_seconds, value)
+            return True
+
+        except Exception as e:
+            logger.error(f'Redis set error for key: {key}: {e}')
+            return False
@@ -1,83 +1,75 @@
+import asyncio
 import logging
-import shutil
-import tempfile
-
-from openpyxl import load_workbook
+from typing import Optional
 
 from fastapi_app.services.redis import RedisService
-from processors.excel_generator import TimeSheetGenerator
+from processors.excel_generator import EMPLOYEE_NAME_PLACEHOLDER, TimeSheetGenerator
 
 logger = logging.getLogger(__name__)
 
 
 class TimesheetCacheService:
     TIMESHEET_CACHE_TTL = 86400  # 24 hours
+    FILE_ID_CACHE_TTL = 86400  # 24 hours
 
-    def __init__(self, redis_service: RedisService, timesheet_generator: TimeSheetGenerator):
+    def __init__(self, redis_service: RedisService):
         self.redis_service = redis_service
-        self.timesheet_generator = timesheet_generator
-        self.month = self.timesheet_generator.month
-        self.year = self.timesheet_generator.year
+        self._in_flight: dict[tuple[int, int], asyncio.Task] = {}
 
     def _get_template_cache_key(self, month: int, year: int) -> str:
         return f'timesheet:template:{month:02}:{year}'
 
-    async def generate_timesheet(self, employee_name: str) -> str:
-        """Generate a timesheet using cached template"""
-        template_cache_key = self._get_template_cache_key(self.month, self.year)
+    def _get_file_id_cache_key(self, employee_name: str, month: int, year: int) -> str:
+        return f'timesheet:file_id:{month:02}:{year}:{employee_name}'
+
+    async def get_file_id(self, *, employee_name: str, month: int, year: int) -> Optional[str]:
+        """Get Telegram file id of the timesheet already sent to the employee"""
+        if file_id := await self.redis_service.get_raw(self._get_file_id_cache_key(employee_name, month, year)):
+            return file_id.decode()
+        return None
+
+    async def set_file_id(self, *, employee_name: str, month: int, year: int, file_id: str) -> bool:
+        """Remember Telegram file id of the timesheet sent to the employee"""
+        return await self.redis_service.set_raw(
+            key=self._get_file_id_cache_key(employee_name, month, year),
+            value=file_id,
+            expire_seconds=self.FILE_ID_CACHE_TTL
+        )
+
+    async def get_template(self, timesheet_generator: TimeSheetGenerator) -> bytes:
+        """Get the shared timesheet template of the generator's month, generating it on a cache miss"""
+        month, year = timesheet_generator.month, timesheet_generator.year
+
+        # Concurrent requests for the same month share a single load of the template
+        task = self._in_flight.get((month, year))
+        if task is None:
+            task = asyncio.create_task(self._load_template(timesheet_generator))
+            self._in_flight[(month, year)] = task
+            task.add_done_callback(lambda _: self._in_flight.pop((month, year), None))
 
-        # Check cache first
-        cached_file_path = await self.redis_service.get(template_cache_key)
+        # Shielded, so a cancelled request does not cancel the load for the others
+        return await asyncio.shield(task)
 
-        if cached_file_path:
-            logger.info(f"Cache hit for timesheet {self.month}-{self.year}")
-            return await self._generate_timesheet_for_employee_from_template(
-                employee_name=employee_name,
-                template_path=cached_file_path
-            )
+    async def _load_template(self, timesheet_generator: TimeSheetGenerator) -> bytes:
+        """Get the month's template from Redis, generating and caching it on a miss"""
+        month, year = timesheet_generator.month, timesheet_generator.year
+        template_cache_key = self._get_template_cache_key(month, year)
 
-        # Cache miss - generate the timesheet
-        logger.info(f"Cache miss for timesheet {self.month}/{self.year}")
-        template_path = await self.timesheet_generator.generate_timesheet()
+        if template := await self.redis_service.get_raw(template_cache_key):
+            logger.info(f"Cache hit for timesheet {month}-{year}")
+            return template
 
-        # Cache the template path
-        await self.redis_service.set(
+        # Cache miss - generate the template
+        logger.info(f"Cache miss for timesheet {month}/{year}")
+        template = await timesheet_generator.generate_timesheet_bytes(employee_name=EMPLOYEE_NAME_PLACEHOLDER)
+
+        # Cache the template content, so it is shared by all workers
+        await self.redis_service.set_raw(
             key=template_cache_key,
-            value=template_path,
+            value=template,
             expire_seconds=self.TIMESHEET_CACHE_TTL
         )
-        return await self._generate_timesheet_for_employee_from_template(
-            employee_name=employee_name,
-            template_path=template_path
-        )
-
-    async def _generate_timesheet_for_employee_from_template(self, *, employee_name: str, template_path: str) -> str:
-        """Generate employee-specific timesheet from template"""
-        try:
-            prefix_args = ['Timesheet', employee_name.replace(' ', '_'), f'{self.month:02}', str(self.year)]
-
-            with tempfile.NamedTemporaryFile(
-                    prefix='_'.join(prefix_args),
-                    suffix='.xlsx',
-                    delete=False
-            ) as tmp_file:
-                employee_file_path = tmp_file.name
-
-                # Copy template to new location
-                shutil.copy2(template_path, employee_file_path)
-
-                # Load WB and add employee's name
-                workbook = load_workbook(filename=employee_file_path)
-                worksheet = workbook.active
-                worksheet['A1'].value = employee_name
-                workbook.save(filename=employee_file_path)
-                workbook.close()
-                logger.info(f'✅ Generated timesheet from template for {employee_name}: {employee_file_path}')
-                return employee_file_path
-
-        except Exception as e:
-            logger.error(f'❌ Error generating from template for {employee_name}: {str(e)}')
-            return await self.timesheet_generator.generate_timesheet(employee_name=employee_name)
+        return template
 
     async def invalidate_all_timesheets(self):
         """Invalidate all cached timesheets"""
@@ -1,4 +1,6 @@
-from sqlalchemy import Table, Boolean, Column, Date, DateTime, Float, ForeignKey, Integer, MetaData, String
+from sqlalchemy import (
+    Table, Boolean, Column, Date, DateTime, Float, ForeignKey, Integer, MetaData, String, UniqueConstraint
+)
 
 metadata = MetaData()
 
@@ -25,4 +27,6 @@ workhours = Table(
     Column('vacation_hours', Float, default=0),
     Column('sick_hours', Float, default=0),
     Column('created_at', DateTime),
+    # Created by the Django migrations, its index serves lookups by employee and date range
+    UniqueConstraint('employee_id', 'date', name='workhours_unique_employee_date'),
 )
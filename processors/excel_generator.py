@@ -1,103 +1,153 @@
+import asyncio
 import calendar
+import io
 import logging
-import os
+import re
 import tempfile
+import zipfile
 from datetime import datetime
+from xml.sax.saxutils import escape
 
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill
+import xlsxwriter
 
 logger = logging.getLogger(__name__)
 
+# Written in place of the employee name when generating a shared template
+EMPLOYEE_NAME_PLACEHOLDER = '{{EMPLOYEE_NAME}}'
+
+# Cell formats, each registered once per workbook and shared by all its cells
+_TITLE_FORMAT = {'bold': True, 'font_size': 14}
+_BOLD_FORMAT = {'bold': True}
+_DAY_FORMAT = {'bold': True, 'align': 'center'}
+_WEEKEND_FORMAT = {**_DAY_FORMAT, 'pattern': 1, 'bg_color': '#808080'}
+
+_DAY_NAMES = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+
+# Characters XML 1.0 forbids or Excel reads as _xHHHH_ escapes, such names need a full generation
+_UNPATCHABLE_NAME_RE = re.compile(r'[\x00-\x08\x0b-\x1f\ud800-\udfff\ufffe\uffff]|_x[0-9a-fA-F]{4}_')
+
 
 class TimeSheetGenerator:
     """Generates Excel timesheet templates for employee time tracking."""
 
-    def __init__(self) -> None:
-        """Initialize with current date settings."""
-        self.current_date = datetime.now()
-        self.month = self.current_date.month
-        self.year = self.current_date.year
+    SPOOL_MAX_SIZE = 2 * 1024 * 1024  # keep generated files up to 2 MiB in memory
+
+    def __init__(self, month: int | None = None, year: int | None = None) -> None:
+        """Initialize for the given month, the current one by default."""
+        if (month is None) != (year is None):
+            raise ValueError('Month and year must be given together')
+
+        if month is None:
+            now = datetime.now()
+            month, year = now.month, now.year
+
+        self.month = month
+        self.year = year
+        self.first_weekday, self.total_days = calendar.monthrange(year, month)
+        self.month_name = calendar.month_name[month]
 
-    async def generate_timesheet(self, employee_name: str | None = None) -> str:
+    async def generate_timesheet_bytes(self, employee_name: str | None = None) -> bytes:
         """
-        Generates a clean, simple timesheet Excel file
+        Generates the timesheet Excel file in memory, in a worker thread to keep the event loop free
 
         Args:
             employee_name (str): Employee name for timesheet header
 
         Returns:
-            Path to generated Excel file
+            Content of the generated Excel file
+        """
+        return await asyncio.to_thread(self.generate_timesheet_bytes_sync, employee_name)
+
+    def generate_timesheet_bytes_sync(self, employee_name: str | None = None) -> bytes:
+        """
+        Generates the timesheet Excel file in memory
+
+        Args:
+            employee_name (str): Employee name for timesheet header
+
+        Returns:
+            Content of the generated Excel file
         """
         try:
-            logger.info(f'📊 Generating timesheet')
-
-            # Create workbook
-            wb = Workbook()
-            ws = wb.active
-            ws.title = 'Timesheet'
-
-            # SIMPLE HEADER
-            ws['A1'] = f'Timesheet - {employee_name}' if employee_name else 'Timesheet'
-            ws['A1'].font = Font(size=14, bold=True)
-
-            ws['A2'] = f'Period: {calendar.month_name[self.month]} {self.year}'
-            ws['A2'].font = Font(bold=True)
-
-            headers = [
-                'Regular hours', 'Overtime hours', 'Vacation hours', 'Sick hours', 'Holiday hours'
-            ]
-
-            for row, header in enumerate(headers, 6):
-                cell = ws.cell(row=row, column=1, value=header)
-                cell.font = Font(bold=True)
-
-            # FILL DATES FOR THE MONTH
-            total_days = calendar.monthrange(self.year, self.month)[1]
-            day_names = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
-
-            for day in range(1, total_days + 1):
-                align_center = Alignment(horizontal='center')
-                font_bold = Font(bold=True)
-                col_offset = 4
-                current_date = datetime(self.year, self.month, day)
-                day_name = day_names[current_date.weekday()]
-                is_weekend = current_date.weekday() >= 5
-
-                # Date
-                day_number_cell = ws.cell(row=4, column=col_offset + day, value=current_date.strftime('%d'))
-                day_number_cell.alignment = align_center
-                day_number_cell.font = font_bold
-                day_name_cell = ws.cell(row=5, column=col_offset + day, value=day_name)
-                day_name_cell.alignment = align_center
-                day_name_cell.font = font_bold
-
-                if is_weekend:
-                    fill = PatternFill(fill_type='solid', fgColor='808080')
-                    day_number_cell.fill = fill
-                    day_name_cell.fill = fill
-
-                    for r in range(6, 11):
-                        ws.cell(row=r, column=col_offset + day).fill = fill
-
-            # Use tempfile dir but with a specific file name
-            with tempfile.NamedTemporaryFile(
-                    suffix='.xlsx',
-                    delete=False,
-                    dir=tempfile.gettempdir()
-            ) as tmp_file:
-                filename = f'Timesheet_{self.month:02}_{self.year}.xlsx'
-                # rename tmp file to filename
-                file_path = os.path.join(tempfile.gettempdir(), filename)
-                os.rename(tmp_file.name, file_path)
-
-            wb.save(file_path)
-            logger.info(f'✅ Timesheet saved: {file_path}')
-
-            return file_path
-
-        except Exception as e:
-            logger.error(f'❌ Error: {str(e)}')
-            import traceback
-            logger.error(f'🔍 Details: {traceback.format_exc()}')
+            # Small files never touch the disk, larger ones roll over to a temp file
+            with tempfile.SpooledTemporaryFile(max_size=self.SPOOL_MAX_SIZE) as spool:
+                self._write_workbook(spool, employee_name=employee_name)
+                spool.seek(0)
+                return spool.read()
+
+        except Exception:
+            logger.exception('❌ Error generating timesheet for %s', employee_name)
             raise
+
+    @staticmethod
+    def fill_employee_name(template: bytes, employee_name: str) -> bytes:
+        """
+        Puts the employee name into a template generated with EMPLOYEE_NAME_PLACEHOLDER
+
+        Only the XML part holding the placeholder is changed, the workbook itself is never parsed.
+
+        Args:
+            template (bytes): Content of the template Excel file
+            employee_name (str): Employee name for timesheet header
+
+        Returns:
+            Content of the employee's Excel file
+
+        Raises:
+            ValueError: If the name can't be written into the raw XML as is, generate the timesheet instead
+        """
+        # The patched text has no xml:space="preserve", surrounding whitespace would be dropped
+        if _UNPATCHABLE_NAME_RE.search(employee_name) or employee_name != employee_name.strip():
+            raise ValueError(f'Employee name {employee_name!r} cannot be patched into the template')
+
+        placeholder = EMPLOYEE_NAME_PLACEHOLDER.encode()
+        name = escape(employee_name).encode()
+        output = io.BytesIO()
+
+        with zipfile.ZipFile(io.BytesIO(template)) as src, zipfile.ZipFile(output, 'w') as dst:
+            for item in src.infolist():
+                data = src.read(item)
+                if placeholder in data:
+                    data = data.replace(placeholder, name)
+                dst.writestr(item, data)
+
+        return output.getvalue()
+
+    def _write_workbook(self, target, employee_name: str | None = None) -> None:
+        """Writes the timesheet workbook for the current month to a binary file object"""
+        logger.info('📊 Generating timesheet for %s', employee_name)
+
+        # Parts are assembled in memory, so xlsxwriter creates no temp files of its own
+        wb = xlsxwriter.Workbook(target, {'in_memory': True})
+        ws = wb.add_worksheet('Timesheet')
+
+        title_format = wb.add_format(_TITLE_FORMAT)
+        bold_format = wb.add_format(_BOLD_FORMAT)
+        day_format = wb.add_format(_DAY_FORMAT)
+        weekend_format = wb.add_format(_WEEKEND_FORMAT)
+
+        first_day_column = 4  # after the row headers and the empty columns
+        header_row = 5
+
+        # SIMPLE HEADER
+        ws.write_string(0, 0, f'Timesheet - {employee_name}' if employee_name else 'Timesheet', title_format)
+        ws.write_string(1, 0, f'Period: {self.month_name} {self.year}', bold_format)
+
+        headers = [
+            'Regular hours', 'Overtime hours', 'Vacation hours', 'Sick hours', 'Holiday hours'
+        ]
+        ws.write_column(header_row, 0, headers, bold_format)
+
+        # FILL DATES FOR THE MONTH
+        for day in range(1, self.total_days + 1):
+            weekday = (self.first_weekday + day - 1) % 7
+            column = first_day_column + day - 1
+
+            if weekday >= 5:
+                ws.write_column(3, column, [f'{day:02}', _DAY_NAMES[weekday]], weekend_format)
+                for row in range(header_row, header_row + len(headers)):
+                    ws.write_blank(row, column, None, weekend_format)
+            else:
+                ws.write_column(3, column, [f'{day:02}', _DAY_NAMES[weekday]], day_format)
+
+        wb.close()